@@ -1,114 +1,151 @@
-import json
-import time
+import orjson
+import random
+import threading
 from google.cloud import firestore
 import logging
+import google.cloud.logging
+
+google.cloud.logging.Client().setup_logging(log_level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest time a request waits for new translations before returning empty
+_LONG_POLL_SECONDS = 15
+
+_ERR_MISSING_PARAMS = (orjson.dumps({'error': 'Missing required parameters'}), 400)
+
+# Lets clients skip parsing long-poll responses that carry nothing new
+_NO_NEW_TRANSLATIONS_HEADERS = {'X-Translation-Count': '0'}
+
+# Shared fields of the placeholder entry returned when there is no new text
+_EMPTY_TRANSLATION = {
+    'translatedText': '',
+    'sourceLanguage': '',
+    'isComplete': True,
+    'empty': True
+}
+
+def _empty_response(entry_id, target_language, sequence):
+    """Serialize a response holding a single empty placeholder translation."""
+    return orjson.dumps({
+        'success': True,
+        'translations': [dict(
+            _EMPTY_TRANSLATION,
+            id=entry_id,
+            messageId=entry_id,
+            targetLanguage=target_language,
+            sequence=sequence
+        )]
+    })
+
+# Reused across invocations served by the same instance
+_db = None
+
+def _get_db():
+    """Return the instance-wide Firestore client, creating it on first use."""
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
+
+def _get_field(doc, field, default=''):
+    """Read a single field from a snapshot without copying the whole document."""
+    try:
+        return doc.get(field)
+    except KeyError:
+        return default
 
 def get_translations(request):
     """Retrieve translations for a meeting participant."""
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
     try:
         meeting_code = request.args.get('meetingCode')
         target_language = request.args.get('targetLanguage')
         last_sequence = request.args.get('sequence')
 
-        logger.info(f"Getting translations for meeting {meeting_code}, language {target_language}, after sequence {last_sequence}")
+        logger.info("Getting translations for meeting %s, language %s, after sequence %s", meeting_code, target_language, last_sequence)
 
         if not meeting_code or not target_language:
-            return json.dumps({'error': 'Missing required parameters'}), 400
+            return _ERR_MISSING_PARAMS
 
         # Handle initial registration request
 
         if last_sequence is None:
             logger.info("Processing initial registration request")
-                # Initialize Firestore client
-            db = firestore.Client()
+            db = _get_db()
             # Get the latest sequence number
             metadata_ref = db.collection('meetings').document(meeting_code).collection('metadata').document('sequence')
             sequence_doc = metadata_ref.get()
             current_sequence = 0 if not sequence_doc.exists else sequence_doc.to_dict().get('value', 0)
             
-            logger.info(f"Starting from sequence number: {current_sequence}")
+            logger.info("Starting from sequence number: %s", current_sequence)
             
-            return json.dumps({
-                'success': True,
-                'translations': [{
-                    'id': 'registration',
-                    'messageId': 'registration',
-                    'translatedText': '',
-                    'sourceLanguage': '',
-                    'targetLanguage': target_language,
-                    'sequence': current_sequence,  # Use the current sequence instead of 0
-                    'isComplete': True,
-                    'empty': True
-                }]
-            }), 200
-
-        # Initialize Firestore
-        db = firestore.Client()
+            # Use the current sequence instead of 0
+            return _empty_response('registration', target_language, current_sequence), 200
+
+        db = _get_db()
         translations_ref = db.collection('meetings').document(meeting_code).collection('translations')
         
-        # Wait up to 15 seconds for new content
-        start_time = time.time()
-        results = []
         last_sequence = int(last_sequence)
-        
-        while time.time() - start_time < 15:
-            # Create fresh query each time
-            query = translations_ref
-            query = query.where('targetLanguage', '==', target_language)
-            query = query.where('isComplete', '==', True)
-            query = query.where('sequence', '>', last_sequence)
-            query = query.order_by('sequence')
-
-            logger.info(f"Executing query for translations after sequence {last_sequence}")
-            translations = query.stream()
-            
-            for doc in translations:
-                data = doc.to_dict()
-                sequence = data.get('sequence')
-                
-                if sequence is not None:
-                    logger.info(f"Found translation with sequence {sequence}")
-                    results.append({
-                        'translatedText': data.get('translatedText', ''),
-                        'sourceLanguage': data.get('sourceLanguage', ''),
-                        'sequence': sequence
-                    })
-            
-            if results:
-                logger.info(f"Found {len(results)} translations")
-                break
-                
-            logger.info("No results yet, waiting...")
-            time.sleep(1)  # Poll every second
+        query = translations_ref
+        query = query.where('targetLanguage', '==', target_language)
+        query = query.where('isComplete', '==', True)
+        query = query.order_by('sequence')
+        # Seek straight to the client's position in the index rather than filtering on sequence
+        query = query.start_after({'sequence': last_sequence})
+        # Cap the batch; the client picks up anything further on its next request
+        query = query.limit(50)
+
+        # Wait up to 15 seconds for new content, letting Firestore push it to us.
+        # Jitter the deadline so idle listeners that started together don't all
+        # time out and reconnect in the same instant.
+        results = []
+        ready = threading.Event()
+        snapshots = 0
+
+        def on_snapshot(docs, changes, read_time):
+            nonlocal snapshots
+            if ready.is_set():
+                return
+            snapshots += 1
+
+            # Read only the fields we return rather than copying the whole document;
+            # ordering by sequence guarantees every document has that field
+            found = []
+            for doc in docs:
+                sequence = doc.get('sequence')
+                logger.debug("Found translation with sequence %s", sequence)
+                found.append({
+                    'translatedText': _get_field(doc, 'translatedText'),
+                    'sourceLanguage': _get_field(doc, 'sourceLanguage'),
+                    'sequence': sequence
+                })
+
+            if found:
+                results.extend(found)
+                ready.set()
+
+        watch = query.on_snapshot(on_snapshot)
+        try:
+            ready.wait(timeout=_LONG_POLL_SECONDS * random.uniform(0.8, 1.0))
+        finally:
+            watch.unsubscribe()
 
         # If no results after waiting, return empty response
         if not results:
-            logger.info("No translations found after waiting, returning empty response")
-            return json.dumps({
-                'success': True,
-                'translations': [{
-                    'id': f'empty_{last_sequence}',
-                    'messageId': f'empty_{last_sequence}',
-                    'translatedText': '',
-                    'sourceLanguage': '',
-                    'targetLanguage': target_language,
-                    'sequence': last_sequence,
-                    'isComplete': True,
-                    'empty': True
-                }]
-            }), 200
+            logger.info("Long-poll done snapshots=%d found=0 sequence=%d", snapshots, last_sequence)
+            return (
+                _empty_response(f'empty_{last_sequence}', target_language, last_sequence),
+                200,
+                _NO_NEW_TRANSLATIONS_HEADERS
+            )
 
         # Sort by sequence and concatenate texts
         results.sort(key=lambda x: x['sequence'])
         concatenated_text = ' '.join(r['translatedText'].strip() for r in results)
         highest_sequence = results[-1]['sequence']
 
-        logger.info(f"Returning concatenated text with highest sequence {highest_sequence}")
+        logger.info("Long-poll done snapshots=%d found=%d sequence=%d", snapshots, len(results), highest_sequence)
         
-        return json.dumps({
+        return orjson.dumps({
             'success': True,
             'translations': [{
                 'id': f'concat_{highest_sequence}',
@@ -120,8 +157,8 @@ def get_translations(request):
                 'isComplete': True,
                 'empty': False
             }]
-        }), 200
+        }), 200, {'X-Translation-Count': str(len(results))}
 
     except Exception as e:
-        logger.error(f"Error in get_translations: {str(e)}")
-        return json.dumps({'error': str(e)}), 500
\ No newline at end of file
+        logger.error("Error in get_translations: %s", e)
+        return orjson.dumps({'error': str(e)}), 500
\ No newline at end of file
@@ -1,54 +1,74 @@
 import os
-import json
-import random
-import string
+import orjson
+import base64
+import secrets
 from google.cloud import firestore
 import logging
+import google.cloud.logging
 
+google.cloud.logging.Client().setup_logging(log_level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+_ERR_METHOD_NOT_ALLOWED = (orjson.dumps({'error': 'Method not allowed'}), 405, _JSON_HEADERS)
+_ERR_INVALID_JSON = (orjson.dumps({'error': 'Invalid JSON'}), 400, _JSON_HEADERS)
+_ERR_MISSING_PARAMS = (orjson.dumps({'error': 'Missing required parameters'}), 400, _JSON_HEADERS)
+
+# Reused across invocations served by the same instance
+_db = None
+
+def _get_db():
+    """Return the instance-wide Firestore client, creating it on first use."""
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
 
 def generate_meeting_code():
-    """Generate a random 6-character uppercase meeting code."""
-    return ''.join(random.choices(string.ascii_uppercase, k=6))
+    """Generate a random 6-character uppercase base32 meeting code."""
+    return base64.b32encode(secrets.token_bytes(4))[:6].decode('ascii')
 
 def generate_participant_id():
     """Generate a unique participant ID."""
-    return f"p{''.join(random.choices(string.digits, k=10))}"
+    return f"p{secrets.token_hex(5)}"
 
 def join_meeting(request):
     """Handle meeting join requests."""
-    logging.basicConfig(level=logging.DEBUG)
-    logger = logging.getLogger(__name__)
-    
     if request.method != 'POST':
-        return json.dumps({'error': 'Method not allowed'}), 405, {'Content-Type': 'application/json'}
+        return _ERR_METHOD_NOT_ALLOWED
     
     try:
-        request_data = request.get_json()
+        try:
+            request_data = orjson.loads(request.get_data(cache=False))
+        except orjson.JSONDecodeError:
+            return _ERR_INVALID_JSON
+
+        if not isinstance(request_data, dict):
+            return _ERR_INVALID_JSON
+
         meeting_code = request_data.get('meetingCode')
         target_language = request_data.get('targetLanguage')
         
-        logger.debug(f"Join request for meeting {meeting_code} with language {target_language}")
+        logger.debug("Join request for meeting %s with language %s", meeting_code, target_language)
         
         if not meeting_code or not target_language:
-            return json.dumps({'error': 'Missing required parameters'}), 400, {'Content-Type': 'application/json'}
+            return _ERR_MISSING_PARAMS
         
-        db = firestore.Client()
+        db = _get_db()
         meeting_ref = db.collection('meetings').document(meeting_code)
-        meeting = meeting_ref.get()
-        
         participant_id = generate_participant_id()
         
-        if not meeting.exists:
-            # Create new meeting if it doesn't exist
-            logger.info(f"Creating new meeting {meeting_code}")
-            
-            # Create in transaction to ensure sequence number is initialized
-            transaction = db.transaction()
+        # Read and write in one transaction so the sequence counter is initialized
+        # together with a new meeting, without a separate pre-flight read
+        transaction = db.transaction()
+
+        @firestore.transactional
+        def join_in_transaction(transaction, meeting_ref):
+            meeting = meeting_ref.get(transaction=transaction)
 
-            @firestore.transactional
-            def create_meeting(transaction, meeting_ref):
-                meeting_ref.set({
+            if not meeting.exists:
+                logger.info("Creating new meeting %s", meeting_code)
+                transaction.set(meeting_ref, {
                     'code': meeting_code,
                     'status': 'active',
                     'targetLanguages': [target_language],
@@ -56,33 +76,27 @@ def join_meeting(request):
                         participant_id: target_language
                     }
                 })
-                
+
                 # Initialize sequence counter
                 sequence_ref = meeting_ref.collection('metadata').document('sequence')
                 transaction.set(sequence_ref, {'value': 0})
-            
-            create_meeting(transaction, meeting_ref)
-        else:
-            # Update existing meeting
-            logger.info(f"Updating existing meeting {meeting_code}")
-            meeting_data = meeting.to_dict()
-            if target_language not in meeting_data.get('targetLanguages', []):
-                meeting_ref.update({
-                    'targetLanguages': firestore.ArrayUnion([target_language]),
-                    f'participants.{participant_id}': target_language
-                })
             else:
-                meeting_ref.update({
+                # ArrayUnion leaves targetLanguages untouched if the language is already present
+                logger.info("Updating existing meeting %s", meeting_code)
+                transaction.update(meeting_ref, {
+                    'targetLanguages': firestore.ArrayUnion([target_language]),
                     f'participants.{participant_id}': target_language
                 })
+
+        join_in_transaction(transaction, meeting_ref)
         
-        return json.dumps({
+        return orjson.dumps({
             'success': True,
             'participantId': participant_id
-        }), 200, {'Content-Type': 'application/json'}
+        }), 200, _JSON_HEADERS
         
     except Exception as e:
-        logger.error(f"Error in join_meeting: {str(e)}")
-        return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+        logger.error("Error in join_meeting: %s", e)
+        return orjson.dumps({'error': str(e)}), 500, _JSON_HEADERS
     
 
@@ -1,12 +1,103 @@
 import os
-import json
+import orjson
 import base64
-import wave
-import io
+import functools
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import speech_v1
 from google.cloud import translate_v2
 from google.cloud import firestore
 import logging
+import google.cloud.logging
+
+google.cloud.logging.Client().setup_logging(log_level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_ERR_METHOD_NOT_ALLOWED = (orjson.dumps({'error': 'Method not allowed'}), 405)
+_ERR_INVALID_JSON = (orjson.dumps({'error': 'Invalid JSON'}), 400)
+_ERR_MEETING_NOT_FOUND = (orjson.dumps({'error': 'Meeting not found'}), 404)
+_NO_SPEECH_RESPONSE = (orjson.dumps({
+    'success': True,
+    'transcription': '',
+    'translations': []
+}), 200)
+
+_REQUIRED_PARAMS = ('meetingCode', 'sourceLanguage', 'audioData')
+
+# (format tag, channels, sample rate, bits per sample) matching the LINEAR16 config
+_WAV_FORMAT = (1, 1, 16000, 16)
+
+# Where raw WAV uploads carry each required parameter, for error messages
+_RAW_PARAM_SOURCES = {
+    'meetingCode': 'X-Meeting-Code',
+    'sourceLanguage': 'X-Source-Language',
+    'audioData': 'request body'
+}
+
+# Clients are reused across invocations served by the same instance
+_speech_client = None
+_translate_client = None
+_db = None
+
+# Shared by all invocations on this instance; caps concurrent Translate calls
+_translate_executor = ThreadPoolExecutor(max_workers=8)
+
+def _get_speech_client():
+    """Return the instance-wide Speech-to-Text client."""
+    global _speech_client
+    if _speech_client is None:
+        _speech_client = speech_v1.SpeechClient()
+    return _speech_client
+
+def _get_translate_client():
+    """Return the instance-wide Translation client."""
+    global _translate_client
+    if _translate_client is None:
+        _translate_client = translate_v2.Client()
+    return _translate_client
+
+def _get_db():
+    """Return the instance-wide Firestore client."""
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
+
+def extract_pcm_data(wav_bytes):
+    """Return the PCM payload of a WAV file, checking it matches the recognition config."""
+    riff, _, wave_id = struct.unpack_from('<4sI4s', wav_bytes, 0)
+    if riff != b'RIFF' or wave_id != b'WAVE':
+        raise ValueError('Audio is not a WAV file')
+
+    audio_format = None
+    offset = 12
+    while offset + 8 <= len(wav_bytes):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', wav_bytes, offset)
+        offset += 8
+        if chunk_id == b'fmt ':
+            # (format tag, channels, sample rate, byte rate, block align, bits per sample)
+            audio_format = struct.unpack_from('<HHIIHH', wav_bytes, offset)
+        elif chunk_id == b'data':
+            if audio_format is None:
+                raise ValueError('WAV file has no fmt chunk before its data')
+            format_tag, channels, sample_rate, _, _, bits_per_sample = audio_format
+            if (format_tag, channels, sample_rate, bits_per_sample) != _WAV_FORMAT:
+                raise ValueError('WAV audio must be 16-bit PCM, 16 kHz mono')
+            return wav_bytes[offset:offset + chunk_size]
+        # Chunks are word-aligned
+        offset += chunk_size + (chunk_size & 1)
+
+    raise ValueError('WAV file has no data chunk')
+
+@functools.lru_cache(maxsize=4096)
+def translate_text(text, source_code, target_language):
+    """Translate text, reusing results for phrases this instance has already translated."""
+    translation = _get_translate_client().translate(
+        text,
+        target_language=target_language,
+        source_language=source_code
+    )
+    return translation['translatedText']
 
 def get_next_sequence(transaction, meeting_ref):
     """Get and increment the sequence number atomically."""
@@ -25,46 +116,53 @@ def get_next_sequence(transaction, meeting_ref):
 
 def process_audio(request):
     """Process audio file for speech recognition and translation."""
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
     try:
         if request.method != 'POST':
-            return json.dumps({'error': 'Method not allowed'}), 405
+            return _ERR_METHOD_NOT_ALLOWED
+
+        # Raw WAV bodies carry their parameters in headers, skipping JSON and base64
+        raw_audio = request.mimetype == 'application/octet-stream'
 
         # Parse request
-        try:
-            request_json = request.get_json()
-        except Exception as e:
-            logger.error(f"Failed to parse request JSON: {str(e)}")
-            return json.dumps({'error': 'Invalid JSON'}), 400
+        if raw_audio:
+            request_json = {
+                'meetingCode': request.headers.get('X-Meeting-Code'),
+                'sourceLanguage': request.headers.get('X-Source-Language'),
+                'audioData': request.get_data()
+            }
+        else:
+            # cache=False lets the raw body be freed once parsed
+            try:
+                request_json = orjson.loads(request.get_data(cache=False))
+            except orjson.JSONDecodeError as e:
+                logger.error("Failed to parse request JSON: %s", e)
+                return _ERR_INVALID_JSON
+
+            if not isinstance(request_json, dict):
+                return _ERR_INVALID_JSON
 
         # Validate parameters
-        meeting_code = request_json.get('meetingCode')
-        source_language = request_json.get('sourceLanguage')
-        audio_data = request_json.get('audioData')
+        missing = [k for k in _REQUIRED_PARAMS if not request_json.get(k)]
+        if missing:
+            if raw_audio:
+                missing = [_RAW_PARAM_SOURCES[k] for k in missing]
+            return orjson.dumps({'error': f'Missing parameters: {missing}'}), 400
 
-        if not all([meeting_code, source_language, audio_data]):
-            missing = [k for k in ['meetingCode', 'sourceLanguage', 'audioData'] 
-                      if not request_json.get(k)]
-            return json.dumps({'error': f'Missing parameters: {missing}'}), 400
+        meeting_code = request_json['meetingCode']
+        source_language = request_json['sourceLanguage']
+        audio_data = request_json['audioData']
 
         # Process audio
         try:
-            decoded_audio = base64.b64decode(audio_data)
+            decoded_audio = audio_data if raw_audio else base64.b64decode(audio_data)
+            pcm_data = extract_pcm_data(decoded_audio)
             
-            with io.BytesIO(decoded_audio) as wav_io:
-                with wave.open(wav_io, 'rb') as wav_file:
-                    pcm_data = wav_file.readframes(wav_file.getnframes())
-                    
         except Exception as e:
-            logger.error(f"Audio processing error: {str(e)}")
-            return json.dumps({'error': f'Audio processing error: {str(e)}'}), 400
+            logger.error("Audio processing error: %s", e)
+            return orjson.dumps({'error': f'Audio processing error: {str(e)}'}), 400
 
-        # Initialize clients
-        speech_client = speech_v1.SpeechClient()
-        translate_client = translate_v2.Client()
-        db = firestore.Client()
+        speech_client = _get_speech_client()
+        db = _get_db()
 
         # Perform speech recognition
         audio = speech_v1.RecognitionAudio(content=pcm_data)
@@ -78,11 +176,7 @@ def process_audio(request):
         response = speech_client.recognize(config=config, audio=audio)
         
         if not response.results:
-            return json.dumps({
-                'success': True,
-                'transcription': '',
-                'translations': []
-            }), 200
+            return _NO_SPEECH_RESPONSE
 
         transcription = response.results[0].alternatives[0].transcript
         confidence = response.results[0].alternatives[0].confidence
@@ -92,64 +186,62 @@ def process_audio(request):
         meeting = meeting_ref.get()
         
         if not meeting.exists:
-            return json.dumps({'error': 'Meeting not found'}), 404
+            return _ERR_MEETING_NOT_FOUND
 
         target_languages = meeting.to_dict().get('targetLanguages', [])
-        translations = []
-        
-        # Use a transaction to get sequence numbers and store translations
+
+        # A bare target like 'en' matches an 'en-US' speaker too; translating to the
+        # source language is rejected by the API, so skip it before making the call
+        source_code = source_language.partition('-')[0]
+        languages_to_translate = tuple(
+            lang for lang in target_languages if lang != source_language and lang != source_code
+        )
+
+        def translate_to(target_lang):
+            try:
+                logger.info("Translating to %s", target_lang)
+                translated_text = translate_text(transcription, source_code, target_lang)
+            except Exception as e:
+                logger.error("Translation error for %s: %s", target_lang, e)
+                return None
+
+            return {
+                'targetLanguage': target_lang,
+                'translatedText': translated_text
+            }
+
+        # Translate to every language in parallel, before opening the transaction
+        # so network calls don't hold it open
+        translations = [t for t in _translate_executor.map(translate_to, languages_to_translate) if t]
+        translations_generated = len(translations)
+
+        # Build the documents up front so the transaction only has to stamp the sequence
+        translations_ref = meeting_ref.collection('translations')
+        base_translation_data = {
+            'sourceText': transcription,
+            'sourceLanguage': source_language,
+            'confidence': confidence,
+            'isComplete': True
+        }
+        pending_writes = [
+            (translations_ref.document(), dict(base_translation_data, **translation))
+            for translation in translations
+        ]
+
+        # Use a transaction to get a sequence number and store translations
         transaction = db.transaction()
-        translations_generated = 0
 
         @firestore.transactional
         def update_in_transaction(transaction, meeting_ref):
-            nonlocal translations_generated
-            
             sequence = get_next_sequence(transaction, meeting_ref)
-            batch = db.batch()
-
-            for target_lang in target_languages:
-                if target_lang != source_language:
-                    try:
-                        logger.info(f"Translating to {target_lang}")
-                        translation = translate_client.translate(
-                            transcription,
-                            target_language=target_lang,
-                            source_language=source_language.split('-')[0]
-                        )
-                        
-                        translation_data = {
-                            'sourceText': transcription,
-                            'sourceLanguage': source_language,
-                            'targetLanguage': target_lang,
-                            'translatedText': translation['translatedText'],
-                            'sequence': sequence,
-                            'confidence': confidence,
-                            'isComplete': True
-                        }
-                        
-                        # Store in Firestore
-                        translation_ref = meeting_ref.collection('translations').document()
-                        transaction.set(translation_ref, translation_data)
-                        
-                        # Add to response
-                        translations.append({
-                            'targetLanguage': target_lang,
-                            'translatedText': translation['translatedText']
-                        })
-                        
-                        translations_generated += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Translation error for {target_lang}: {str(e)}")
-                        continue
-            
-            return translations
+
+            for translation_ref, translation_data in pending_writes:
+                transaction.set(translation_ref, dict(translation_data, sequence=sequence))
 
         # Execute the transaction
         update_in_transaction(transaction, meeting_ref)
         
-        return json.dumps({
+        return orjson.dumps({
             'success': True,
             'transcription': transcription,
             'confidence': confidence,
@@ -158,5 +250,5 @@ def process_audio(request):
         }), 200
 
     except Exception as e:
-        logger.error(f"Error in process_audio: {str(e)}")
-        return json.dumps({'error': str(e)}), 500
\ No newline at end of file
+        logger.error("Error in process_audio: %s", e)
+        return orjson.dumps({'error': str(e)}), 500
\ No newline at end of file
@@ -1,52 +1,88 @@
 import os
-import json
-import time
+import orjson
 import subprocess
+import sys
 import requests
-import base64
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def run_command(cmd):
-    """Run a shell command and return output."""
-    process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
-    return stdout.decode().strip(), stderr.decode()
+TERRAFORM_STATE = 'terraform.tfstate'
+OUTPUTS_CACHE = '.terraform-outputs.cache.json'
+
+def run_command(argv):
+    """Run a command (argument list, no shell) and return output."""
+    result = subprocess.run(argv, capture_output=True, text=True)
+    return result.stdout.strip(), result.stderr
 
 def get_function_urls():
     """Get the Cloud Function URLs from Terraform outputs."""
+    # Reuse the previous run's URLs until terraform state changes
+    try:
+        if os.path.getmtime(OUTPUTS_CACHE) >= os.path.getmtime(TERRAFORM_STATE):
+            with open(OUTPUTS_CACHE, 'rb') as f:
+                return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        pass
+    
+    # One terraform invocation for all outputs instead of one per URL
+    stdout, _ = run_command(['terraform', 'output', '-json'])
+    outputs = orjson.loads(stdout) if stdout else {}
+    
     urls = {}
     for function in ['join_meeting_url', 'process_audio_url', 'get_translations_url']:
-        stdout, _ = run_command(f'terraform output -raw {function}')
-        if not stdout:
+        if not outputs.get(function, {}).get('value'):
             raise ValueError(f"Could not get URL for {function} from terraform output")
-        urls[function] = stdout.strip()
+        urls[function] = outputs[function]['value'].strip()
+    
+    with open(OUTPUTS_CACHE, 'wb') as f:
+        f.write(orjson.dumps(urls))
     return urls
 
 def get_logs(limit=150):
     """Get Cloud Function logs."""
-    cmd = f'gcloud functions logs read --limit {limit}'
-    stdout, stderr = run_command(cmd)
-    print("\nCloud Function Logs:")
-    print(stdout)
+    stdout, stderr = run_command(['gcloud', 'functions', 'logs', 'read', '--limit', str(limit)])
+    # Emit the whole section in one write rather than a print per part
+    output = ["\nCloud Function Logs:", stdout]
     if stderr:
-        print("Errors:", stderr)
+        output.append(f"Errors: {stderr}")
+    sys.stdout.write('\n'.join(output) + '\n')
+    sys.stdout.flush()
 
 class TranslationTester:
     def __init__(self, urls):
         self.urls = urls
         self.participants = {}
         self.last_sequences = {}
+        
+        # Reuse one pooled connection per host instead of a new TLS handshake per call
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json'})
+        # raise_on_status=False hands back the last 5xx response so its error body is still printed
+        retries = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[500, 502, 503, 504],
+            raise_on_status=False
+        )
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retries))
+    
+    def close(self):
+        """Release pooled connections."""
+        self.session.close()
     
     def join_meeting(self, meeting_code, language):
         """Join a meeting with specified language."""
-        response = requests.post(
+        response = self.session.post(
             self.urls['join_meeting_url'],
-            json={
+            data=orjson.dumps({
                 'meetingCode': meeting_code,
                 'targetLanguage': language
-            }
+            }),
+            headers={'Content-Type': 'application/json'}
         )
-        data = response.json()
+        data = orjson.loads(response.content)
         if data.get('success'):
             participant_id = data['participantId']
             self.participants[language] = participant_id
@@ -56,6 +92,11 @@ class TranslationTester:
             print(f"Failed to join meeting: {data.get('error', 'Unknown error')}")
         return data
     
+    def join_meeting_as(self, meeting_code, languages):
+        """Join a meeting as several listeners concurrently."""
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            return list(executor.map(lambda lang: self.join_meeting(meeting_code, lang), languages))
+    
     def send_audio(self, meeting_code, audio_file):
         """Send audio file for translation."""
         wav_file = audio_file
@@ -63,21 +104,21 @@ class TranslationTester:
             wav_file = audio_file.replace('.base64', '.wav')
         
         try:
-            with open(wav_file, 'rb') as f:
-                audio_data = base64.b64encode(f.read()).decode('utf-8')
+            print(f"\nSending audio file: {wav_file} (size: {os.path.getsize(wav_file)} bytes)")
             
-            print(f"\nSending audio file: {wav_file} (encoded length: {len(audio_data)})")
-            
-            response = requests.post(
-                self.urls['process_audio_url'],
-                json={
-                    'meetingCode': meeting_code,
-                    'sourceLanguage': 'en-US',
-                    'audioData': audio_data
-                }
-            )
+            # Upload the WAV as the raw request body; requests streams it from the file
+            with open(wav_file, 'rb') as f:
+                response = self.session.post(
+                    self.urls['process_audio_url'],
+                    data=f,
+                    headers={
+                        'Content-Type': 'application/octet-stream',
+                        'X-Meeting-Code': meeting_code,
+                        'X-Source-Language': 'en-US'
+                    }
+                )
             
-            data = response.json()
+            data = orjson.loads(response.content)
             if data.get('success'):
                 print(f"Successfully processed audio: {wav_file}")
                 print(f"Transcription: {data.get('transcription', '')}")
@@ -96,8 +137,8 @@ class TranslationTester:
             print(f"Error processing audio file: {str(e)}")
             raise
     
-    def get_translations(self, meeting_code, language):
-        """Get translations for a specific language."""
+    def get_translations(self, meeting_code, language, out=print):
+        """Get translations for a specific language, reporting progress through out."""
         params = {
             'meetingCode': meeting_code,
             'targetLanguage': language
@@ -107,61 +148,81 @@ class TranslationTester:
             params['sequence'] = self.last_sequences[language]
         
         try:
-            print(f"\nGetting translations for {language}...")
+            out(f"\nGetting translations for {language}...")
             if self.last_sequences[language] is None:
-                print("Initial registration request")
+                out("Initial registration request")
             else:
-                print(f"Requesting content after sequence {self.last_sequences[language]}")
+                out(f"Requesting content after sequence {self.last_sequences[language]}")
                 
-            response = requests.get(
+            response = self.session.get(
                 self.urls['get_translations_url'],
                 params=params,
-                timeout=20
+                timeout=(5, 30)  # Server holds the request open for up to 15s
             )
             
             if response.status_code != 200:
-                print(f"Error: Server returned status code {response.status_code}")
-                print(f"Response: {response.text}")
+                out(f"Error: Server returned status code {response.status_code}")
+                out(f"Response: {response.text}")
                 return None
+            
+            # Nothing new: the sequence is unchanged, so there is no need to parse the body
+            if response.headers.get('X-Translation-Count') == '0':
+                out(f"No new content for {language}")
+                return {'success': True, 'translations': []}
                 
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if not data.get('success'):
-                print(f"Error: {data.get('error', 'Unknown error')}")
+                out(f"Error: {data.get('error', 'Unknown error')}")
                 return data
             
-            if data.get('translations'):
-                translation = data['translations'][0]  # Should only be one
+            translations = data.get('translations')
+            if translations:
+                translation = translations[0]  # Should only be one
+                sequence = translation.get('sequence')
                 
                 # Always store sequence, even for empty responses
-                if translation.get('sequence') is not None:
-                    self.last_sequences[language] = translation['sequence']
-                    print(f"Updated sequence for {language} to {translation['sequence']}")
+                if sequence is not None:
+                    self.last_sequences[language] = sequence
+                    out(f"Updated sequence for {language} to {sequence}")
                 
                 if translation.get('empty'):
-                    print(f"No new content for {language}")
+                    out(f"No new content for {language}")
                 else:
-                    print(f"Received translation for {language}:")
-                    print(f"Text: {translation['translatedText']}")
-                    print(f"Sequence: {translation['sequence']}")
+                    out(f"Received translation for {language}:")
+                    out(f"Text: {translation.get('translatedText', '')}")
+                    out(f"Sequence: {sequence}")
             
             return data
             
         except requests.Timeout:
-            print(f"Request timed out waiting for translations for {language}")
+            out(f"Request timed out waiting for translations for {language}")
             return None
         except Exception as e:
-            print(f"Error getting translations: {str(e)}")
+            out(f"Error getting translations: {str(e)}")
             return None
 
+    def get_translations_for(self, meeting_code, languages):
+        """Get translations for several languages concurrently."""
+        # Each call can block on the server's long-poll, so don't wait on them in turn.
+        # Output is collected per language and printed afterwards so lines don't interleave.
+        outputs = {lang: [] for lang in languages}
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            results = list(executor.map(
+                lambda lang: self.get_translations(meeting_code, lang, outputs[lang].append),
+                languages
+            ))
+        for lang in languages:
+            print('\n'.join(outputs[lang]))
+        return results
+
 def main():
+    tester = None
     try:
         # Get function URLs from terraform output
         print("Getting function URLs from terraform output...")
         urls = get_function_urls()
-        print("Function URLs:")
-        for name, url in urls.items():
-            print(f"{name}: {url}")
+        print('\n'.join(["Function URLs:"] + [f"{name}: {url}" for name, url in urls.items()]))
         
         # Initialize tester
         tester = TranslationTester(urls)
@@ -169,15 +230,13 @@ def main():
         
         # Join meeting as Korean and Spanish listeners
         print("\nJoining meeting as listeners...")
-        tester.join_meeting(meeting_code, "ko")
-        tester.join_meeting(meeting_code, "es")
+        tester.join_meeting_as(meeting_code, ["ko", "es"])
         
         # Initial registration requests - store returned sequences
         print("\nPerforming initial registration...")
+        tester.get_translations_for(meeting_code, ["ko", "es"])
         for lang in ["ko", "es"]:
-            response = tester.get_translations(meeting_code, lang)
             print(f"Initial sequence for {lang}: {tester.last_sequences[lang]}")
-            time.sleep(1)
         
         # Send first audio file
         print("\nSending first audio file...")
@@ -188,9 +247,7 @@ def main():
             
             print("\nGetting translations after first audio...")
             print("Using sequences:", tester.last_sequences)
-            for lang in ["ko", "es"]:
-                tester.get_translations(meeting_code, lang)
-                time.sleep(1)
+            tester.get_translations_for(meeting_code, ["ko", "es"])
         
         # Join as French listener
         print("\nJoining meeting as French listener...")
@@ -202,14 +259,11 @@ def main():
         print("\nSending second audio file...")
         response = tester.send_audio(meeting_code, "hungry.wav")
         if response and response.get('success'):
-    #        print("Waiting for translations to process...")
-            time.sleep(1)
-            
+            # No settling delay needed: translations are committed before send_audio
+            # returns, and get_translations waits server-side for anything newer
             print("\nGetting translations after second audio...")
             print("Using sequences:", tester.last_sequences)
-            for lang in ["ko", "es", "fr"]:
-                tester.get_translations(meeting_code, lang)
-                time.sleep(1)
+            tester.get_translations_for(meeting_code, ["ko", "es", "fr"])
         
         # Final delay before getting logs
     #    time.sleep(3)
@@ -222,6 +276,9 @@ def main():
         print("2. Have the WAV files (hike.wav and hungry.wav)")
         print("3. Have proper permissions set up")
         raise
+    finally:
+        if tester is not None:
+            tester.close()
 
 if __name__ == "__main__":
     main()